@@ -1,11 +1,15 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import altair as alt
 import matplotlib.pyplot as plt
+import functools
 import io
 import os
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
 
@@ -16,13 +20,20 @@ try:
 except ImportError:
     pass  # dotenv not available, will use system env vars only
 
+# Optional fast JSON encoder used by sanitize_for_streamlit
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Helper to read configuration values first from environment, then from
 # Streamlit secrets (so the same code works locally with .env or in
 # Streamlit Cloud with st.secrets).
-def get_config(key, default=None):
-    """Return configuration value from environment or Streamlit secrets.
+@functools.lru_cache(maxsize=32)
+def _get_config_cached(key):
+    """Look up key in the environment, then in Streamlit secrets; None on miss.
 
-    Priority: os.environ -> st.secrets -> default
+    Memoized so repeated reruns don't walk st.secrets again for the same key.
     """
     # 1) check OS environment
     val = os.environ.get(key)
@@ -43,44 +54,70 @@ def get_config(key, default=None):
         # if streamlit isn't available or secrets missing, ignore
         pass
 
-    return default
+    return None
+
+
+def get_config(key, default=None):
+    """Return configuration value from environment or Streamlit secrets.
+
+    Priority: os.environ -> st.secrets -> default
+    """
+    val = _get_config_cached(key)
+    return default if val is None else val
 
 
 def sanitize_for_streamlit(df: pd.DataFrame, max_rows: int | None = None) -> pd.DataFrame:
     """Return a copy of df safe to pass to Streamlit (convert non-JSON-serializable
     object columns to strings). Optionally limit rows with max_rows.
+
+    Frames without object columns are returned as a shallow copy, with their
+    datetimes and index untouched.
     """
     if df is None or df.empty:
         return df.copy()
 
-    out = df.copy()
-    if max_rows is not None:
-        out = out.head(max_rows).copy()
+    # shallow copy: the passes below replace whole columns, never write in place
+    out = (df if max_rows is None else df.head(max_rows)).copy(deep=False)
+
+    # frames typed at load time (see _to_arrow_strings) need no conversion
+    if not any(pd.api.types.is_object_dtype(dt) for dt in out.dtypes):
+        return out
 
     def _safe_serialize(x):
-        # keep NaN/None
-        if pd.isna(x):
+        # keep None/NaN — cheap identity and self-inequality checks before pd.isna
+        if x is None:
+            return x
+        if isinstance(x, float) and x != x:
             return x
         # common primitives and datetimes — keep as-is
-        if isinstance(x, (str, int, float, bool, pd.Timestamp, datetime, timedelta)):
+        if isinstance(x, _PRIMITIVE_TYPES):
+            return x
+        # exotic missing values (pd.NA, np.datetime64('NaT'), ...); pd.isna only on scalars
+        if pd.api.types.is_scalar(x) and pd.isna(x):
             return x
         # lists/dicts/other objects -> try JSON, fallback to str
         try:
-            return json.dumps(x, default=str, ensure_ascii=False)
+            return orjson.dumps(x, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
         except Exception:
             try:
                 return str(x)
             except Exception:
                 return repr(x)
 
-    # Convert ALL object columns to string to avoid pyarrow serialization issues
-    for col in out.columns:
-        if out[col].dtype == 'object':
-            out[col] = out[col].apply(_safe_serialize)
+    def _is_plain(series):
+        # a sample of primitives only means the final astype(str) is enough
+        return series.head(64).map(lambda x: x is None or isinstance(x, (str, int, float, bool))).all()
 
     # ensure datetimes are converted to strings to avoid timezone/pyarrow issues
     for dt_col in out.select_dtypes(include=['datetime64[ns]', 'datetimetz']).columns:
         out[dt_col] = out[dt_col].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    # JSON-encode object columns holding lists/dicts/other objects; without
+    # orjson they are left to the astype(str) pass below
+    if orjson is not None:
+        for col in out.columns:
+            if out[col].dtype == 'object' and not _is_plain(out[col]):
+                out[col] = out[col].apply(_safe_serialize)
         
     # Convert any remaining complex dtypes to strings
     for col in out.columns:
@@ -88,11 +125,36 @@ def sanitize_for_streamlit(df: pd.DataFrame, max_rows: int | None = None) -> pd.
             out[col] = out[col].astype(str)
             
     # Reset index to avoid any index-related serialization issues
-    out = out.reset_index(drop=True)
+    out.index = pd.RangeIndex(len(out))
 
     return out
 
 
+def _to_arrow_strings(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """Cast text object columns of df (in place) to the pyarrow-backed string dtype.
+
+    Only `columns` are cast when given; otherwise every object column is.
+    Frames typed this way pass through sanitize_for_streamlit untouched.
+    """
+    cols = df.columns if columns is None else [c for c in columns if c in df.columns]
+    for col in cols:
+        if df[col].dtype == 'object':
+            df[col] = df[col].astype('string[pyarrow]')
+    return df
+
+
+# Scalar types Streamlit/pyarrow serialize without help (NaN is a float and
+# NaT a datetime, so missing values are covered too)
+_PRIMITIVE_TYPES = (str, int, float, bool, type(None), pd.Timestamp, datetime, timedelta)
+
+
+def _is_primitive(x):
+    return isinstance(x, _PRIMITIVE_TYPES) or x is pd.NA
+
+
+_IS_PRIMITIVE_UFUNC = np.frompyfunc(_is_primitive, 1, 1)
+
+
 def diagnose_problem_columns(df: pd.DataFrame, sample_rows: int = 10) -> None:
     """Print diagnostic info for columns that contain non-primitive values.
 
@@ -103,16 +165,14 @@ def diagnose_problem_columns(df: pd.DataFrame, sample_rows: int = 10) -> None:
         print("[diagnose] dataframe empty or None")
         return
 
-    def _is_primitive(x):
-        return isinstance(x, (str, int, float, bool, type(None))) or pd.isna(x) or isinstance(x, (pd.Timestamp, datetime, timedelta))
-
     print("[diagnose] Starting problem column detection...")
     problematic = []
     head = df.head(sample_rows)
     for col in df.columns:
         # if column dtype object, check sample for non-primitive values
         if df[col].dtype == 'object':
-            has_non_prim = head[col].apply(lambda v: not _is_primitive(v)).any()
+            values = head[col].to_numpy(copy=False)
+            has_non_prim = not _IS_PRIMITIVE_UFUNC(values).astype(bool).all()
             if has_non_prim:
                 problematic.append(col)
 
@@ -151,6 +211,116 @@ except Exception:
     create_engine = None
 
 
+@st.cache_resource
+def _mongo_client(uri: str):
+    """Cliente MongoDB compartilhado entre reruns do Streamlit."""
+    return MongoClient(uri)
+
+
+@st.cache_resource
+def _timestamp_index_hint(uri: str, namespace: str, _coll):
+    """Garante o índice em timestamp da coleção de logs uma vez por processo
+    (não a cada recarga); retorna o hint da consulta, ou None se não foi possível."""
+    try:
+        _coll.create_index([("timestamp", -1)])
+        return [("timestamp", -1)]
+    except Exception as e:
+        print(f"⚠️ Não foi possível garantir índice em timestamp: {e}")
+        return None
+
+
+@st.cache_resource
+def _pg_engine(url: str):
+    """Engine SQLAlchemy compartilhada entre reruns do Streamlit."""
+    return create_engine(url)
+
+
+# Colunas de texto das denúncias/sessões (tipadas como strings Arrow na carga)
+TEXT_COLUMNS = [
+    'protocolo', 'nome', 'email', 'descricao', 'prioridade', 'status', 'uf',
+    'titulo', 'conversation_id', 'priority', 'protocol', 'channel',
+    'intent_final', 'fallback_phrase',
+]
+
+# Campos dos logs usados pelo painel (projeção da consulta no MongoDB e
+# colunas do DataFrame de logs; caminhos com ponto são campos aninhados)
+MONGO_LOG_FIELDS = [
+    '_id', 'timestamp', 'component', 'level', 'message', 'intentName',
+    'queryText', 'protocolo', 'prioridade', 'uf', 'channel',
+    'dialogflowSessionId', 'session_id', 'sessionId',
+    'context.protocolo', 'context.intentName', 'context.queryText',
+    'context.prioridade', 'context.uf', 'context.channel',
+    'context.dialogflowSessionId', 'context.session_id',
+]
+
+
+# Padrão de conclusão de fluxo nas mensagens de log. Fica como texto (com
+# case=False) porque colunas string[pyarrow] usam o motor regex do Arrow e não
+# aceitam re.Pattern compilado.
+_COMPLETED_PATTERN = r'concluído|concluido|Fluxo'
+
+
+def _text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """Coluna de texto sem nulos para .str.contains/comparações ('' se ausente)"""
+    if col not in df.columns:
+        return pd.Series('', index=df.index)
+    values = df[col]
+    if isinstance(values.dtype, pd.StringDtype):
+        return values.fillna('')
+    # None/NaN viram '' (e não 'None'/'nan') antes da conversão para texto
+    return values.where(values.notna(), '').astype(str)
+
+
+def _naive_datetimes(ts: pd.Series) -> pd.Series:
+    """Timestamps no horário local, sem fuso (tz-aware -> wall time)"""
+    return ts.dt.tz_localize(None) if ts.dt.tz is not None else ts
+
+
+def _hour_of_day(ts: pd.Series) -> pd.Series:
+    """Hora do dia (0-23) dos timestamps válidos, por aritmética inteira em datetime64[h]"""
+    ts = _naive_datetimes(ts.dropna())
+    return pd.Series(ts.to_numpy(dtype='datetime64[h]').astype('int64') % 24, index=ts.index)
+
+
+def _hourly_counts(ts: pd.Series, name: str) -> pd.DataFrame:
+    """Quantidade de timestamps por hora do dia (colunas 'hour' e name)"""
+    return _hour_of_day(ts).value_counts().sort_index().rename_axis('hour').reset_index(name=name)
+
+
+def _logs_frame(docs, fields=MONGO_LOG_FIELDS) -> pd.DataFrame:
+    """Monta o DataFrame de logs coluna a coluna (buffers Arrow) a partir dos documentos.
+
+    Campos ausentes em todos os documentos não viram coluna; ObjectId vira string.
+    """
+    paths = [(field, field.split('.')) for field in fields]
+    columns = {field: [] for field in fields}
+    for doc in docs:
+        for field, parts in paths:
+            value = doc
+            for part in parts:
+                value = value.get(part) if isinstance(value, dict) else None
+            columns[field].append(value)
+    
+    if '_id' in columns:
+        columns['_id'] = [None if v is None else str(v) for v in columns['_id']]
+    
+    arrays = {}
+    for field, values in columns.items():
+        if all(v is None for v in values):
+            continue
+        try:
+            arrays[field] = pa.array(values)
+        except (pa.ArrowException, TypeError, ValueError):
+            # tipos mistos na mesma coluna -> texto
+            arrays[field] = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    
+    df_logs = pa.table(arrays).to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+    # pyarrow recente preserva a unidade dos timestamps (us); o painel usa ns
+    for col in df_logs.select_dtypes(include='datetime').columns:
+        df_logs[col] = df_logs[col].astype('datetime64[ns]')
+    return df_logs
+
+
 def load_mongodb_logs():
     """Carrega logs do MongoDB para análise de conversação"""
     mongo_uri = get_config("MONGO_URI")
@@ -159,7 +329,7 @@ def load_mongodb_logs():
     
     try:
         print("🔄 Conectando ao MongoDB para logs...")
-        client = MongoClient(mongo_uri)
+        client = _mongo_client(mongo_uri)
         
         # Extract database name from URI
         if '/' in mongo_uri and '?' in mongo_uri:
@@ -174,20 +344,26 @@ def load_mongodb_logs():
         # Find the logs collection
         coll = db['denuncias_logs']
         
-        # Load recent logs (last 30 days)
+        # Garantir índice em timestamp para o filtro/ordenação por período
+        index_hint = _timestamp_index_hint(mongo_uri, coll.full_name, coll)
+        
+        # Load recent logs (last 30 days), trazendo apenas os campos usados no painel
         cutoff = datetime.now() - timedelta(days=30)
-        docs = list(coll.find({"timestamp": {"$gte": cutoff}}))
-        print(f"📊 MongoDB: {len(docs)} logs encontrados")
+        cursor = coll.find(
+            {"timestamp": {"$gte": cutoff}},
+            projection={field: 1 for field in MONGO_LOG_FIELDS},
+        ).batch_size(1000)
+        if index_hint:
+            cursor = cursor.hint(index_hint)
         
-        if docs:
-            df_logs = pd.json_normalize(docs)
+        # Consumir o cursor direto nas colunas, sem lista intermediária de documentos
+        df_logs = _logs_frame(cursor)
+        print(f"📊 MongoDB: {len(df_logs)} logs encontrados")
+        
+        if not df_logs.empty:
             if 'timestamp' in df_logs.columns:
                 df_logs['timestamp'] = pd.to_datetime(df_logs['timestamp'])
             
-            # Converter ObjectId para string para evitar erro do Arrow
-            if '_id' in df_logs.columns:
-                df_logs['_id'] = df_logs['_id'].astype(str)
-            
             return df_logs
         
         return pd.DataFrame()
@@ -195,39 +371,60 @@ def load_mongodb_logs():
         print(f"❌ Erro ao carregar logs do MongoDB: {e}")
         return pd.DataFrame()
 
+def _log_protocols(logs: pd.DataFrame) -> pd.Series:
+    """Protocolo de cada log: campo da raiz, ou context.protocolo quando ausente/vazio"""
+    protocols = logs['protocolo'] if 'protocolo' in logs.columns else pd.Series(None, index=logs.index, dtype=object)
+    protocols = protocols.replace('', None)
+    if 'context.protocolo' in logs.columns:
+        protocols = protocols.fillna(logs['context.protocolo'].replace('', None))
+    return protocols
+
+
 def combine_postgres_and_mongo_data():
     """Combina dados do Postgres (denúncias) com logs do MongoDB"""
     print("🔄 Iniciando carregamento combinado de dados...")
     
-    # 1. Carregar denúncias do Postgres (dados estruturados de negócio)
+    # 1. Carregar denúncias do Postgres (dados estruturados de negócio) e
+    # 2. logs do MongoDB (dados de conversação/eventos) em paralelo — as duas
+    #    cargas são independentes e limitadas por rede
     database_url = get_config('DATABASE_URL')
-    pg_data = pd.DataFrame()
-    
-    if database_url and create_engine is not None:
-        pg_data = load_denuncias_from_postgres(database_url)
     
-    # 2. Carregar logs do MongoDB (dados de conversação/eventos)
-    mongo_logs = load_mongodb_logs()
+    # os workers herdam o contexto da sessão (st.secrets)
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=2, initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+        pg_future = None
+        if database_url and create_engine is not None:
+            pg_future = executor.submit(load_denuncias_from_postgres, database_url)
+        mongo_future = executor.submit(load_mongodb_logs)
+        
+        pg_data = pg_future.result() if pg_future is not None else pd.DataFrame()
+        mongo_logs = mongo_future.result()
     
     # 3. Se temos dados do Postgres, usar como base
     if not pg_data.empty:
         print(f"✅ Usando {len(pg_data)} denúncias do Postgres como base")
-        df_combined = pg_data.copy()
-        
-        # Mapear campos básicos
-        df_combined['conversation_id'] = df_combined.get('protocolo', [f'conv_{i}' for i in range(len(df_combined))])
-        df_combined['priority'] = df_combined.get('prioridade', 'Média')
-        df_combined['protocol'] = df_combined.get('protocolo', '')
-        
-        # Definir valores padrão
-        df_combined['channel'] = 'web'
-        df_combined['slots_filled'] = 6
-        df_combined['slots_total'] = 6
-        df_combined['intent_final'] = 'AbrirChamadoSuporte'
-        df_combined['abandoned'] = False
+        # conversation_id: protocolo, ou conv_ + número da linha (montado só se faltar)
+        if 'protocolo' in pg_data.columns:
+            conversation_ids = pg_data['protocolo']
+        else:
+            conversation_ids = 'conv_' + pd.Series(np.arange(len(pg_data)), index=pg_data.index).astype(str)
         
-        # Valores baseados na lógica de negócio
-        df_combined['escalated'] = (df_combined.get('prioridade') == 'Alta')
+        # Montar todas as colunas derivadas de uma vez: um único assign evita
+        # o copy() inicial seguido de uma inserção de coluna por atribuição
+        df_combined = pg_data.assign(
+            # Mapear campos básicos
+            conversation_id=conversation_ids,
+            priority=pg_data.get('prioridade', 'Média'),
+            protocol=pg_data.get('protocolo', ''),
+            # Definir valores padrão
+            channel='web',
+            slots_filled=6,
+            slots_total=6,
+            intent_final='AbrirChamadoSuporte',
+            abandoned=False,
+            # Valores baseados na lógica de negócio
+            escalated=(pg_data.get('prioridade') == 'Alta'),
+        )
         
         # Para dados do Postgres, não simular completed_at - usar dados reais se disponíveis
         # df_combined['completed_at'] será NaT se não existir no Postgres
@@ -236,18 +433,26 @@ def combine_postgres_and_mongo_data():
         if not mongo_logs.empty:
             print(f"🔗 Enriquecendo com {len(mongo_logs)} logs do MongoDB...")
             
-            # Extrair informações de fallback dos logs
-            fallback_logs = mongo_logs[
-                mongo_logs.get('message', '').astype(str).str.contains('Fallback detectado', na=False) |
-                (mongo_logs.get('intentName', '') == 'Default Fallback Intent')
-            ]
+            # Um único passe sobre os logs: protocolo de cada evento e flags de
+            # fallback/notificação (SendGrid), restrito às denúncias carregadas
+            log_protocols = _log_protocols(mongo_logs)
+            is_fallback = (
+                _text_column(mongo_logs, 'message').str.contains('Fallback detectado', regex=False) |
+                (_text_column(mongo_logs, 'intentName') == 'Default Fallback Intent')
+            )
+            is_notification = _text_column(mongo_logs, 'component').str.contains('SendGrid', regex=False)
+            relevant = (is_fallback | is_notification) & log_protocols.isin(df_combined['protocolo'].dropna().unique())
             
-            # Mapear fallbacks por protocolo (se disponível nos logs)
-            fallback_protocols = set()
-            for _, log in fallback_logs.iterrows():
-                protocol = log.get('protocolo') or log.get('context.protocolo')
-                if protocol:
-                    fallback_protocols.add(protocol)
+            events = pd.DataFrame({
+                'protocolo': log_protocols,
+                'fallback': is_fallback,
+                'notification_sent_at': mongo_logs['timestamp'].where(is_notification),
+            })[relevant]
+            by_protocol = events.groupby('protocolo').agg(
+                fallback=('fallback', 'any'),
+                notification_sent_at=('notification_sent_at', 'min'),  # primeira notificação
+            )
+            fallback_protocols = set(by_protocol.index[by_protocol['fallback']])
             
             # Aplicar informações de fallback
             df_combined['fallback'] = df_combined['protocolo'].isin(fallback_protocols)
@@ -255,33 +460,16 @@ def combine_postgres_and_mongo_data():
             
             # Para protocolos com fallback, definir frase exemplo
             if fallback_protocols:
-                sample_phrases = ["não entendi", "poderia repetir", "erro"]
-                for i, row in df_combined.iterrows():
-                    if row['fallback']:
-                        df_combined.at[i, 'fallback_phrase'] = np.random.choice(sample_phrases)
-            
-            # Extrair informações de notificação (SendGrid logs)
-            notification_logs = mongo_logs[
-                mongo_logs.get('component', '').astype(str).str.contains('SendGrid', na=False)
-            ]
-            
-            # Mapear notificações por protocolo
-            notification_protocols = {}
-            for _, log in notification_logs.iterrows():
-                protocol = log.get('protocolo') or log.get('context.protocolo')
-                if protocol and pd.notna(log.get('timestamp')):
-                    if protocol not in notification_protocols:
-                        notification_protocols[protocol] = log['timestamp']
-                    else:
-                        # Pegar a primeira notificação
-                        if log['timestamp'] < notification_protocols[protocol]:
-                            notification_protocols[protocol] = log['timestamp']
+                sample_phrases = np.array(["não entendi", "poderia repetir", "erro"])
+                fallback_mask = df_combined['fallback'].to_numpy()
+                df_combined.loc[fallback_mask, 'fallback_phrase'] = np.random.default_rng().choice(
+                    sample_phrases, size=int(fallback_mask.sum())
+                )
             
             # Aplicar timestamps de notificação
-            df_combined['notification_sent_at'] = pd.NaT
-            for protocol, timestamp in notification_protocols.items():
-                mask = df_combined['protocolo'] == protocol
-                df_combined.loc[mask, 'notification_sent_at'] = timestamp
+            df_combined['notification_sent_at'] = pd.to_datetime(
+                df_combined['protocolo'].map(by_protocol['notification_sent_at'])
+            )
         
         else:
             # Sem logs do MongoDB, simular dados de conversação
@@ -299,6 +487,9 @@ def combine_postgres_and_mongo_data():
                     pd.to_timedelta(notif_minutes, unit='minutes')
                 )
         
+        # Colunas de texto como strings Arrow (renderização direta no Streamlit)
+        _to_arrow_strings(df_combined, TEXT_COLUMNS)
+        
         # Armazenar logs do MongoDB separadamente para aba específica
         df_combined.attrs['mongo_logs'] = mongo_logs
         
@@ -324,61 +515,57 @@ def generate_synthetic_data(num_rows: int = 500):
     ufs = ["sp", "rj", "mg", "rs", "ba"]
     priorities = ["Alta", "Média", "Baixa"]
 
-    rows = []
-    for i in range(num_rows):
-        created_at = start + timedelta(days=int(rng.integers(0, 90)),
-                                       hours=int(rng.integers(0, 24)),
-                                       minutes=int(rng.integers(0, 60)))
-        duration = timedelta(minutes=int(rng.integers(1, 60*48)))
-        completed_at = created_at + duration
-        
-        pr = rng.choice(priorities, p=[0.15, 0.35, 0.5])
-        notification_delay = None
-        if pr == "Alta":
-            if rng.random() < 0.85:
-                notification_delay = timedelta(minutes=int(rng.integers(1, 10)))
-            else:
-                notification_delay = timedelta(minutes=int(rng.integers(11, 60*6)))
-        notification_sent_at = (created_at + notification_delay) if notification_delay else pd.NaT
-
-        slots_total = 6
-        abandoned = rng.random() < 0.08
-        if abandoned:
-            slots_filled = rng.integers(0, slots_total)
-        else:
-            slots_filled = rng.integers(3, slots_total + 1)
-
-        fallback = rng.random() < 0.12
-        fallback_phrase = None
-        if fallback:
-            sample_fallbacks = ["não entendi", "poderia repetir", "o que você quis dizer", "erro", "não sei"]
-            fallback_phrase = rng.choice(sample_fallbacks)
-
-        escalated = (pr == "Alta") and (rng.random() < 0.6)
-        channel = rng.choice(channels)
-        uf = rng.choice(ufs)
-
-        rows.append({
-            "conversation_id": f"conv_{i}",
-            "channel": channel,
-            "uf": uf,
-            "priority": pr,
-            "created_at": created_at,
-            "completed_at": completed_at if not abandoned else pd.NaT,
-            "notification_sent_at": notification_sent_at,
-            "fallback": fallback,
-            "fallback_phrase": fallback_phrase,
-            "slots_filled": int(slots_filled),
-            "slots_total": slots_total,
-            "escalated": escalated,
-            "abandoned": abandoned,
-            "intent_final": "create_report" if not abandoned else "fallback",
-            "protocol": f"SUP-{created_at.strftime('%Y%m%d')}-{i:05d}"
-        })
-
-    return pd.DataFrame(rows)
-
-@st.cache_data
+    n = num_rows
+    created_at = pd.Timestamp(start) + (
+        pd.to_timedelta(rng.integers(0, 90, n), unit='D')
+        + pd.to_timedelta(rng.integers(0, 24, n), unit='h')
+        + pd.to_timedelta(rng.integers(0, 60, n), unit='m')
+    )
+    duration = pd.to_timedelta(rng.integers(1, 60*48, n), unit='m')
+    completed_at = created_at + duration
+
+    pr = rng.choice(priorities, size=n, p=[0.15, 0.35, 0.5])
+    is_alta = pr == "Alta"
+    # Alta: 85% notificadas em até 10 min, o restante entre 11 min e 6 h
+    notification_delay = np.where(rng.random(n) < 0.85,
+                                  rng.integers(1, 10, n),
+                                  rng.integers(11, 60*6, n))
+    notification_sent_at = (created_at + pd.to_timedelta(notification_delay, unit='m')).where(is_alta)
+
+    slots_total = 6
+    abandoned = rng.random(n) < 0.08
+    slots_filled = np.where(abandoned,
+                            rng.integers(0, slots_total, n),
+                            rng.integers(3, slots_total + 1, n))
+
+    fallback = rng.random(n) < 0.12
+    sample_fallbacks = ["não entendi", "poderia repetir", "o que você quis dizer", "erro", "não sei"]
+    fallback_phrase = np.where(fallback, rng.choice(sample_fallbacks, size=n), None)
+
+    escalated = is_alta & (rng.random(n) < 0.6)
+    channel = rng.choice(channels, size=n)
+    uf = rng.choice(ufs, size=n)
+    ids = pd.Index(np.arange(n)).astype(str)
+
+    return pd.DataFrame({
+        "conversation_id": "conv_" + ids,
+        "channel": channel,
+        "uf": uf,
+        "priority": pr,
+        "created_at": created_at,
+        "completed_at": completed_at.where(~abandoned),
+        "notification_sent_at": notification_sent_at,
+        "fallback": fallback,
+        "fallback_phrase": fallback_phrase,
+        "slots_filled": slots_filled.astype(int),
+        "slots_total": slots_total,
+        "escalated": escalated,
+        "abandoned": abandoned,
+        "intent_final": np.where(abandoned, "fallback", "create_report"),
+        "protocol": "SUP-" + created_at.strftime('%Y%m%d') + "-" + ids.str.zfill(5),
+    })
+
+@st.cache_data(ttl=300)
 def load_or_generate_data(num_rows: int = 500):
     """Função principal que carrega dados combinando Postgres + MongoDB"""
     
@@ -386,11 +573,18 @@ def load_or_generate_data(num_rows: int = 500):
     csv_path = os.path.join(os.path.dirname(__file__), "logs.csv")
     if os.path.exists(csv_path):
         print("✅ Encontrado logs.csv, carregando...")
-        df = pd.read_csv(csv_path, parse_dates=["created_at", "completed_at", "notification_sent_at"])
-        return df
+        # engine pyarrow: leitura multi-thread; texto já vira string[pyarrow]
+        df = pd.read_csv(csv_path, engine='pyarrow',
+                         parse_dates=["created_at", "completed_at", "notification_sent_at"])
+        df = _to_arrow_strings(df)
+    else:
+        # Combinar dados do Postgres (denúncias) + MongoDB (logs)
+        df = combine_postgres_and_mongo_data()
     
-    # Combinar dados do Postgres (denúncias) + MongoDB (logs)
-    return combine_postgres_and_mongo_data()
+    # Marca de cada carga: entra na chave dos caches derivados dos dados
+    # (métricas, CSV), que assim não sobrevivem a uma recarga
+    df.attrs['loaded_at'] = datetime.now()
+    return df
 
 
 def debug_mongo_logs(df_logs: pd.DataFrame):
@@ -464,59 +658,68 @@ def transform_logs_to_sessions(df_logs: pd.DataFrame) -> pd.DataFrame:
             df[col] = df[f'context.{col}']
 
     # Group by session and compute summary
-    sessions = []
     unique_sessions = df['session_id'].dropna().unique()
     print(f"  📊 Sessões únicas encontradas: {len(unique_sessions)}")
     
-    grouped = df.sort_values('timestamp').groupby('session_id')
-    for session_id, grp in grouped:
-        if pd.isna(session_id) or session_id == '' or session_id == 'None':
-            continue
-            
-        created_at = grp['timestamp'].min()
-        # completion: look for logs where message contains 'concluído' or 'Fluxo' concluído
-        completed_rows = grp[grp.get('message', '').astype(str).str.contains('concluído|concluido|Fluxo', case=False, na=False)]
-        completed_at = completed_rows['timestamp'].min() if not completed_rows.empty else pd.NaT
-        
-        # fallback: intentName == 'Default Fallback Intent' or message contains 'Fallback detectado'
-        fallback_flag = False
-        fallback_phrase = None
-        if 'intentName' in grp.columns and (grp['intentName'] == 'Default Fallback Intent').any():
-            fallback_flag = True
-            q = grp.loc[grp['intentName'] == 'Default Fallback Intent']
-            if 'queryText' in q.columns:
-                fallback_phrase = q['queryText'].iloc[0]
-        elif grp.get('message', '').astype(str).str.contains('Fallback detectado', na=False).any():
-            fallback_flag = True
-            
-        # notification: look for SendGrid logs
-        notif_rows = grp[grp.get('component', '').astype(str).str.contains('SendGrid', na=False)]
-        notification_sent_at = notif_rows['timestamp'].min() if not notif_rows.empty else pd.NaT
-
-        # priority/uf if present
-        priority = grp.get('prioridade').dropna().iloc[0] if 'prioridade' in grp.columns and not grp.get('prioridade').dropna().empty else None
-        uf = grp.get('uf').dropna().iloc[0] if 'uf' in grp.columns and not grp.get('uf').dropna().empty else None
-        channel = grp.get('channel').dropna().iloc[0] if 'channel' in grp.columns and not grp.get('channel').dropna().empty else None
-
-        sessions.append({
-            'conversation_id': str(session_id),
-            'channel': channel or 'web',  # Changed from 'unknown' to 'web'
-            'uf': (uf or '').lower() if uf else 'sp',  # Changed from 'n/i' to 'sp'
-            'priority': priority or 'Média',  # Changed from 'N/I' to 'Média'
-            'created_at': created_at,
-            'completed_at': completed_at,
-            'notification_sent_at': notification_sent_at,
-            'fallback': fallback_flag,
-            'fallback_phrase': fallback_phrase,
-            'slots_filled': 6,  # Default value instead of NaN
-            'slots_total': 6,
-            'escalated': not pd.isna(notification_sent_at),
-            'abandoned': pd.isna(completed_at),
-            'intent_final': 'AbrirChamadoSuporte',
-            'protocol': grp.get('protocolo').dropna().iloc[0] if 'protocolo' in grp.columns and not grp.get('protocolo').dropna().empty else f"MONGO-{session_id}"
-        })
-
-    result_df = pd.DataFrame(sessions)
+    # descartar sessões sem identificador e ordenar para que 'first' siga o tempo
+    session_ids = df['session_id']
+    df = df[session_ids.notna() & ~session_ids.astype(str).isin(['', 'None'])].sort_values('timestamp')
+    keys = df['session_id']
+    timestamps = df['timestamp']
+    
+    # flags por evento, calculadas uma única vez sobre todos os logs
+    message = _text_column(df, 'message')
+    # completion: look for logs where message contains 'concluído' or 'Fluxo' concluído
+    is_completed = message.str.contains(_COMPLETED_PATTERN, case=False)
+    # fallback: intentName == 'Default Fallback Intent' or message contains 'Fallback detectado'
+    is_fallback_intent = _text_column(df, 'intentName') == 'Default Fallback Intent'
+    is_fallback = is_fallback_intent | message.str.contains('Fallback detectado', regex=False)
+    # notification: look for SendGrid logs
+    is_notification = _text_column(df, 'component').str.contains('SendGrid', regex=False)
+    
+    summary = pd.DataFrame({
+        'created_at': timestamps.groupby(keys).min(),
+        'completed_at': timestamps.where(is_completed).groupby(keys).min(),
+        'notification_sent_at': timestamps.where(is_notification).groupby(keys).min(),
+        'fallback': is_fallback.groupby(keys).any(),
+        # primeira queryText não nula entre os logs de fallback da sessão
+        'fallback_phrase': (
+            df['queryText'].where(is_fallback_intent).groupby(keys).first()
+            if 'queryText' in df.columns else None
+        ),
+    })
+    
+    # priority/uf/channel/protocolo if present: primeiro valor não nulo da sessão
+    present = [c for c in ['prioridade', 'uf', 'channel', 'protocolo'] if c in df.columns]
+    firsts = df[present].groupby(keys).first().reindex(summary.index)
+    
+    def _first(col, default):
+        values = firsts[col] if col in firsts.columns else pd.Series(None, index=summary.index, dtype=object)
+        return values.where(values.notna() & (values != ''), default)
+    
+    session_str = summary.index.astype(str)
+    sessions = pd.DataFrame({
+        'conversation_id': session_str,
+        'channel': _first('channel', 'web'),  # Changed from 'unknown' to 'web'
+        'uf': _first('uf', None).str.lower().fillna('sp'),  # Changed from 'n/i' to 'sp'
+        'priority': _first('prioridade', 'Média'),  # Changed from 'N/I' to 'Média'
+        'created_at': summary['created_at'],
+        'completed_at': summary['completed_at'],
+        'notification_sent_at': summary['notification_sent_at'],
+        'fallback': summary['fallback'],
+        'fallback_phrase': summary['fallback_phrase'],
+        'slots_filled': 6,  # Default value instead of NaN
+        'slots_total': 6,
+        'escalated': summary['notification_sent_at'].notna(),
+        'abandoned': summary['completed_at'].isna(),
+        'intent_final': 'AbrirChamadoSuporte',
+        'protocol': (
+            firsts['protocolo'].fillna('MONGO-' + session_str.to_series(index=summary.index))
+            if 'protocolo' in firsts.columns else 'MONGO-' + session_str
+        ),
+    }).reset_index(drop=True)
+
+    result_df = _to_arrow_strings(sessions, TEXT_COLUMNS)
     print(f"  ✅ Processadas {len(result_df)} sessões do MongoDB")
     return result_df
 
@@ -529,21 +732,27 @@ def load_denuncias_from_postgres(database_url: str) -> pd.DataFrame:
         print("SQLAlchemy não disponível - usando dados sintéticos para métricas de negócio")
         return pd.DataFrame()
     try:
-        engine = create_engine(database_url)
-        with engine.connect() as conn:
-            # Buscar todas as colunas disponíveis
-            df = pd.read_sql(text('''
+        engine = _pg_engine(database_url)
+        # stream_results: cursor no servidor, lido em blocos de chunksize linhas
+        with engine.connect().execution_options(stream_results=True) as conn:
+            # Buscar as colunas usadas no painel (últimos 90 dias)
+            cutoff = datetime.now() - timedelta(days=90)
+            chunks = pd.read_sql(text('''
                 SELECT protocolo, nome, email, descricao, prioridade, status, 
                        uf, created_at, titulo, data_ocorrido
                 FROM denuncias 
+                WHERE created_at >= :cutoff
                 ORDER BY created_at DESC
-            '''), con=conn)
+            '''), con=conn, params={'cutoff': cutoff}, chunksize=10_000)
+            chunks = list(chunks)
+            df = pd.concat(chunks, ignore_index=True, copy=False) if chunks else pd.DataFrame()
             
             # normalize
             if 'created_at' in df.columns:
                 df['created_at'] = pd.to_datetime(df['created_at'])
             if 'data_ocorrido' in df.columns:
                 df['data_ocorrido'] = pd.to_datetime(df['data_ocorrido'])
+            _to_arrow_strings(df, TEXT_COLUMNS)
                 
             print(f"✅ Carregados {len(df)} registros do Postgres")
             print(f"📊 Colunas: {', '.join(df.columns)}")
@@ -589,8 +798,8 @@ def compute_metrics(df: pd.DataFrame):
     abandonment_rate = 0 if total_conv == 0 else df[df["abandoned"] == True].shape[0] / total_conv
 
     # Business metrics
-    reports_by_channel = df.groupby("channel").size().rename("count").reset_index()
-    reports_by_uf = df.groupby("uf").size().rename("count").reset_index()
+    reports_by_channel = df.groupby("channel", observed=True).size().rename("count").reset_index()
+    reports_by_uf = df.groupby("uf", observed=True).size().rename("count").reset_index()
     pct_high_priority = 0 if total_conv == 0 else df[df["priority"] == "Alta"].shape[0] / total_conv
 
     # Time until notification (minutes) for rows with notification_sent_at
@@ -617,19 +826,21 @@ def compute_metrics(df: pd.DataFrame):
 
 def clean_dataframe(df):
     """Limpa e valida o DataFrame para evitar erros nos gráficos"""
-    df = df.copy()
+    # cópia rasa: as colunas abaixo são substituídas por inteiro, nunca alteradas no lugar
+    df = df.copy(deep=False)
     
     # Clean string columns
     string_cols = ['channel', 'uf', 'priority', 'conversation_id']
     for col in string_cols:
         if col in df.columns:
-            df[col] = df[col].astype(str).replace(['nan', 'None', ''], pd.NA)
+            df[col] = df[col].astype('string[pyarrow]').replace(['nan', 'None', ''], pd.NA)
             df[col] = df[col].fillna('N/I' if col in ['uf', 'priority'] else 'unknown')
     
     # Ensure datetime columns
     datetime_cols = ['created_at', 'completed_at', 'notification_sent_at']
     for col in datetime_cols:
-        if col in df.columns:
+        # colunas que já são datetime64 (drivers/pyarrow) não são reprocessadas
+        if col in df.columns and df[col].dtype.kind != 'M':
             df[col] = pd.to_datetime(df[col], errors='coerce')
     
     # Ensure boolean columns
@@ -663,6 +874,61 @@ def main():
     with tab2:
         show_mongodb_analysis(df)
 
+def _logs_fingerprint(logs: pd.DataFrame):
+    """Impressão digital barata dos logs (tamanho + faixa de timestamps) usada
+    como chave de cache no lugar do hash do DataFrame inteiro."""
+    if logs.empty or 'timestamp' not in logs.columns:
+        return (len(logs), tuple(logs.columns))
+    return (len(logs), logs['timestamp'].min(), logs['timestamp'].max())
+
+
+@st.cache_data(ttl=300, show_spinner=False, hash_funcs={pd.DataFrame: _logs_fingerprint})
+def _derive_mongo_sections(logs: pd.DataFrame) -> dict:
+    """Subconjuntos e agregações da aba de logs, memorizados entre reruns."""
+    # Máscaras calculadas uma única vez sobre a mensagem em minúsculas e
+    # reaproveitadas pelas seções (busca literal, sem regex)
+    intent = _text_column(logs, 'intentName')
+    msg_lower = _text_column(logs, 'message').str.lower()
+    fallback_mask = (
+        intent.eq('Default Fallback Intent') |
+        msg_lower.str.contains('fallback detectado', regex=False)
+    )
+    escalation_request_mask = (
+        intent.eq('falar-com-atendente') |
+        msg_lower.str.contains('solicitação de escalonamento', regex=False)
+    )
+    escalation_mask = escalation_request_mask | msg_lower.str.contains('falar com atendente', regex=False)
+
+    escalation_requests = logs[escalation_request_mask]
+    escalation = logs[escalation_mask]
+    fallback = logs[fallback_mask]
+    errors = logs[logs['level'] == 'ERROR']
+
+    # contagens por hora direto da Series de horas, sem copiar o DataFrame
+    hourly = _hourly_counts(logs['timestamp'], 'logs')
+    hourly_escalations = _hourly_counts(escalation['timestamp'], 'escalations')
+
+    return {
+        'escalation_requests': escalation_requests,
+        'escalation': escalation,
+        'fallback': fallback,
+        'errors': errors,
+        'hourly': hourly,
+        'hourly_escalations': hourly_escalations,
+    }
+
+
+def _md_lines(lines) -> str:
+    """Junta linhas num único bloco markdown, uma por linha (quebra de linha forçada)"""
+    return "  \n".join(lines)
+
+
+def _top_queries(logs: pd.DataFrame, n: int = 10) -> list:
+    """Até n frases (queryText) distintas e não vazias, na ordem em que aparecem."""
+    query_texts = _text_column(logs, 'queryText')
+    return query_texts[query_texts != ''].drop_duplicates().head(n).tolist()
+
+
 def show_mongodb_analysis(df):
     """Aba específica para análise dos logs do MongoDB"""
     st.header("🔍 Análise Detalhada dos Logs MongoDB")
@@ -673,6 +939,7 @@ def show_mongodb_analysis(df):
         
         if not mongo_logs.empty:
             st.success(f"📊 Analisando {len(mongo_logs)} logs do MongoDB")
+            sections = _derive_mongo_sections(mongo_logs)
             
             # Informações básicas dos logs
             col1, col2, col3 = st.columns(3)
@@ -686,25 +953,19 @@ def show_mongodb_analysis(df):
                 # Componentes mais ativos
                 components = mongo_logs['component'].value_counts()
                 st.write("**Componentes Ativos:**")
-                for comp, count in components.head().items():
-                    st.write(f"• {comp}: {count} logs")
+                st.markdown(_md_lines(f"• {comp}: {count} logs" for comp, count in components.head().items()))
             
             with col3:
                 # Níveis de log
                 levels = mongo_logs['level'].value_counts()
                 st.write("**Níveis de Log:**")
-                for level, count in levels.items():
-                    st.write(f"• {level}: {count}")
+                st.markdown(_md_lines(f"• {level}: {count}" for level, count in levels.items()))
                 
                 # Métricas de escalonamento
-                escalation_logs = mongo_logs[
-                    (mongo_logs.get('intentName', '') == 'falar-com-atendente') |
-                    mongo_logs.get('message', '').astype(str).str.contains('Solicitação de escalonamento', na=False)
-                ]
+                escalation_logs = sections['escalation_requests']
                 escalation_sessions = escalation_logs['dialogflowSessionId'].nunique() if not escalation_logs.empty else 0
                 st.write("**Escalonamentos:**")
-                st.write(f"• Sessões: {escalation_sessions}")
-                st.write(f"• Total logs: {len(escalation_logs)}")
+                st.markdown(_md_lines([f"• Sessões: {escalation_sessions}", f"• Total logs: {len(escalation_logs)}"]))
             
             # Gráficos de análise
             st.subheader("📈 Visualizações dos Logs")
@@ -725,9 +986,7 @@ def show_mongodb_analysis(df):
             
             # Timeline de atividade
             st.subheader("⏰ Timeline de Atividade")
-            mongo_logs_timeline = mongo_logs.copy()
-            mongo_logs_timeline['hour'] = mongo_logs_timeline['timestamp'].dt.hour
-            hourly_activity = mongo_logs_timeline.groupby('hour').size().reset_index(name='logs')
+            hourly_activity = sections['hourly']
             
             timeline_chart = alt.Chart(hourly_activity).mark_line(point=True).encode(
                 x=alt.X('hour:O', title='Hora do Dia'),
@@ -739,36 +998,23 @@ def show_mongodb_analysis(df):
             
             # Análise de fallbacks
             st.subheader("💬 Análise de Fallbacks")
-            fallback_logs = mongo_logs[
-                (mongo_logs.get('intentName', '') == 'Default Fallback Intent') |
-                mongo_logs.get('message', '').astype(str).str.contains('Fallback detectado', na=False)
-            ]
+            fallback_logs = sections['fallback']
             
             if not fallback_logs.empty:
                 st.success(f"Encontrados {len(fallback_logs)} logs de fallback")
                 
                 # Frases que causaram fallback
-                fallback_phrases = []
-                for _, log in fallback_logs.iterrows():
-                    query_text = log.get('queryText')
-                    if query_text and pd.notna(query_text):
-                        fallback_phrases.append(query_text)
+                fallback_phrases = _top_queries(fallback_logs)
                 
                 if fallback_phrases:
                     st.write("**Frases que causaram fallback:**")
-                    unique_phrases = list(set(fallback_phrases))[:10]
-                    for i, phrase in enumerate(unique_phrases, 1):
-                        st.write(f"{i}. {phrase}")
+                    st.markdown("\n".join(f"{i}. {phrase}" for i, phrase in enumerate(fallback_phrases, 1)))
             else:
                 st.info("Nenhum log de fallback encontrado")
             
             # Análise de escalonamentos
             st.subheader("📞 Análise de Escalonamentos")
-            escalation_logs = mongo_logs[
-                (mongo_logs.get('intentName', '') == 'falar-com-atendente') |
-                mongo_logs.get('message', '').astype(str).str.contains('Solicitação de escalonamento', na=False) |
-                mongo_logs.get('message', '').astype(str).str.contains('falar com atendente', case=False, na=False)
-            ]
+            escalation_logs = sections['escalation']
             
             if not escalation_logs.empty:
                 st.warning(f"Encontradas {len(escalation_logs)} solicitações de escalonamento")
@@ -778,9 +1024,7 @@ def show_mongodb_analysis(df):
                 st.metric("Sessões que solicitaram escalonamento", unique_sessions)
                 
                 # Timeline de escalonamentos
-                escalation_timeline = escalation_logs.copy()
-                escalation_timeline['hour'] = escalation_timeline['timestamp'].dt.hour
-                hourly_escalations = escalation_timeline.groupby('hour').size().reset_index(name='escalations')
+                hourly_escalations = sections['hourly_escalations']
                 
                 if len(hourly_escalations) > 0:
                     escalation_chart = alt.Chart(hourly_escalations).mark_bar().encode(
@@ -793,52 +1037,58 @@ def show_mongodb_analysis(df):
                     st.altair_chart(escalation_chart, use_container_width=True)
                 
                 # Frases que levaram ao escalonamento
-                escalation_phrases = []
-                for _, log in escalation_logs.iterrows():
-                    query_text = log.get('queryText')
-                    if query_text and pd.notna(query_text):
-                        escalation_phrases.append(query_text)
+                escalation_phrases = _top_queries(escalation_logs)
                 
                 if escalation_phrases:
                     st.write("**Frases que levaram ao escalonamento:**")
-                    unique_phrases = list(set(escalation_phrases))[:10]
-                    for i, phrase in enumerate(unique_phrases, 1):
-                        st.write(f"{i}. {phrase}")
+                    st.markdown("\n".join(f"{i}. {phrase}" for i, phrase in enumerate(escalation_phrases, 1)))
                 
                 # Últimos escalonamentos
                 st.write("**Últimos Escalonamentos:**")
-                recent_escalations = escalation_logs.sort_values('timestamp', ascending=False).head(5)
-                for _, escalation in recent_escalations.iterrows():
-                    session_short = escalation.get('dialogflowSessionId', 'N/A')[:8] + '...' if escalation.get('dialogflowSessionId') else 'N/A'
-                    query = escalation.get('queryText', 'N/A')
-                    st.write(f"📞 [{escalation['timestamp'].strftime('%H:%M:%S')}] Sessão {session_short}: '{query}'")
+                recent_escalations = escalation_logs.nlargest(5, 'timestamp')
+                session_ids = _text_column(recent_escalations, 'dialogflowSessionId')
+                session_short = np.where(session_ids != '', session_ids.str.slice(0, 8) + '...', 'N/A')
+                queries = recent_escalations.reindex(columns=['queryText'])['queryText'].fillna('N/A')
+                st.markdown(_md_lines(
+                    f"📞 [{ts.strftime('%H:%M:%S')}] Sessão {session}: '{query}'"
+                    for ts, session, query in zip(recent_escalations['timestamp'], session_short, queries)
+                ))
                     
             else:
                 st.success("✅ Nenhuma solicitação de escalonamento encontrada!")
             
             # Análise de erros
             st.subheader("🚨 Análise de Erros")
-            error_logs = mongo_logs[mongo_logs['level'] == 'ERROR']
+            error_logs = sections['errors']
             
             if not error_logs.empty:
                 st.warning(f"Encontrados {len(error_logs)} logs de erro")
                 
                 error_components = error_logs['component'].value_counts()
                 st.write("**Erros por Componente:**")
-                for comp, count in error_components.items():
-                    st.write(f"• {comp}: {count} erros")
+                st.markdown(_md_lines(f"• {comp}: {count} erros" for comp, count in error_components.items()))
                 
                 # Mostrar últimos erros
                 st.write("**Últimos Erros:**")
-                recent_errors = error_logs.sort_values('timestamp', ascending=False).head(5)
-                for _, error in recent_errors.iterrows():
-                    st.write(f"⚠️ [{error['timestamp'].strftime('%H:%M:%S')}] {error['component']}: {error['message'][:100]}...")
+                recent_errors = error_logs.nlargest(5, 'timestamp')
+                st.markdown(_md_lines(
+                    f"⚠️ [{ts.strftime('%H:%M:%S')}] {component}: {message[:100]}..."
+                    for ts, component, message in recent_errors[['timestamp', 'component', 'message']].itertuples(index=False, name=None)
+                ))
             else:
                 st.success("✅ Nenhum erro encontrado nos logs!")
             
             # Raw data
             with st.expander("🔍 Visualizar Logs Brutos"):
-                safe_logs = sanitize_for_streamlit(mongo_logs, max_rows=50)
+                # Paginação no servidor: só a janela da página atual é sanitizada
+                # e serializada para o navegador
+                page_size = 20
+                n_pages = max(1, -(-len(mongo_logs) // page_size))
+                page = st.number_input(f"Página (de {n_pages})", min_value=1, max_value=n_pages,
+                                       value=1, step=1, key="raw_logs_page")
+                start = (int(page) - 1) * page_size
+                safe_logs = sanitize_for_streamlit(mongo_logs.iloc[start:start + page_size])
+                safe_logs.index = pd.RangeIndex(start, start + len(safe_logs))
                 try:
                     st.dataframe(safe_logs)
                 except Exception as e:
@@ -851,8 +1101,83 @@ def show_mongodb_analysis(df):
     else:
         st.error("Dados do MongoDB não disponíveis. Verifique a conexão.")
 
+def _opts(series: pd.Series, sentinels) -> list:
+    """Filter options of a categorical series: its (sorted, unique) categories minus sentinels."""
+    return [c for c in series.cat.categories if c not in sentinels]
+
+
+def _reset_filters(filter_options: dict) -> None:
+    """Reset button callback: select every option again in each filter multiselect."""
+    for key, options in filter_options.items():
+        st.session_state[key] = list(options)
+
+
+def _isin_codes(series: pd.Series, values) -> np.ndarray:
+    """series.isin(values) for a categorical series, as an integer test on its codes."""
+    codes = series.cat.categories.get_indexer(values)
+    return np.isin(series.cat.codes.to_numpy(), codes[codes >= 0])
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_metrics(signature, _filtered: pd.DataFrame):
+    """compute_metrics memorizado pela assinatura dos filtros e da carga dos
+    dados; o DataFrame filtrado (prefixo _) não entra no hash."""
+    return compute_metrics(_filtered)
+
+
+def _csv_timestamps(column, tz):
+    """Timestamps na menor resolução que não perde dados, para a exportação CSV"""
+    # segundos inteiros (ms para colunas com fuso); frações que não cabem na
+    # unidade passam para a seguinte, até microssegundos (precisão do Postgres)
+    for unit in (('s', 'ms') if tz is None else ('ms',)):
+        try:
+            return column.cast(pa.timestamp(unit, tz=tz))
+        except pa.ArrowInvalid:
+            pass
+    return column.cast(pa.timestamp('us', tz=tz), safe=False)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _filtered_csv(signature, _filtered: pd.DataFrame) -> bytes:
+    """CSV dos dados filtrados, escrito pelo writer C++ do Arrow e memorizado
+    pela assinatura dos filtros e da carga (o DataFrame, prefixo _, não entra
+    no hash)."""
+    try:
+        table = pa.Table.from_pandas(_filtered, preserve_index=False)
+        # timestamp[ns] sairia com 9 casas decimais, que planilhas não reconhecem
+        # como data (o fuso das colunas é mantido)
+        for i, field in enumerate(table.schema):
+            if pa.types.is_timestamp(field.type):
+                table = table.set_column(i, field.name, _csv_timestamps(table.column(i), field.type.tz))
+        buf = io.BytesIO()
+        pa_csv.write_csv(table, buf)
+        return buf.getvalue()
+    except (pa.ArrowException, TypeError, ValueError):
+        # colunas que o Arrow não converte (objetos mistos) -> writer do pandas
+        return _filtered.to_csv(index=False).encode('utf-8')
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _channel_png(ch_df: pd.DataFrame) -> bytes:
+    """PNG do gráfico de denúncias por canal, memorizado pelos dados do gráfico."""
+    fig, ax = plt.subplots(figsize=(6, 3))
+    try:
+        ax.bar(ch_df['channel'].astype(str), ch_df['count'], color='tab:blue')
+        ax.set_title('Denúncias por Canal')
+        ax.set_ylabel('count')
+        ax.tick_params(axis='x', labelrotation=45)
+        buf_png = io.BytesIO()
+        fig.tight_layout()
+        fig.savefig(buf_png, format='png')
+        return buf_png.getvalue()
+    finally:
+        # libera a figura do registro global do pyplot a cada renderização
+        plt.close(fig)
+
+
 def show_main_dashboard(df):
     """Mostra o dashboard principal com dados do Postgres"""
+    loaded_at = df.attrs.get('loaded_at')
     
     # Debug info
     st.sidebar.markdown("### Debug Info")
@@ -884,7 +1209,7 @@ def show_main_dashboard(df):
             st.sidebar.write(f"Protocolos válidos: {len(valid_protocols)}")
         
         if 'fallback' in df.columns:
-            fallback_count = df['fallback'].sum()
+            fallback_count = int(df['fallback'].to_numpy(dtype=bool).sum())
             st.sidebar.write(f"Conversas com fallback: {fallback_count}")
         
         # Show sample data
@@ -932,8 +1257,15 @@ def show_main_dashboard(df):
         df['channel'] = df['canal']
     
     # Fill missing columns with defaults when loading from Postgres only
+    # (callables are only evaluated when the column is actually missing)
+    def row_labels(prefix):
+        # protocolo when available, otherwise prefix + row number (built only then)
+        if 'protocolo' in df.columns:
+            return df['protocolo']
+        return prefix + pd.Series(np.arange(len(df)), index=df.index).astype(str)
+
     required_columns = {
-        'conversation_id': lambda x: df.get('protocolo', f'conv_{x}'),
+        'conversation_id': lambda: row_labels('conv_'),
         'channel': 'web',
         'uf': 'n/i', 
         'priority': 'N/I',
@@ -946,21 +1278,28 @@ def show_main_dashboard(df):
         'escalated': False,
         'abandoned': False,
         'intent_final': 'create_report',
-        'protocol': lambda x: df.get('protocolo', f'SUP-{x}')
+        'protocol': lambda: row_labels('SUP-')
     }
     
-    for col, default_val in required_columns.items():
-        if col not in df.columns:
-            if callable(default_val):
-                df[col] = [default_val(i) for i in range(len(df))]
-            else:
-                df[col] = default_val
+    missing_columns = {
+        col: default_val() if callable(default_val) else default_val
+        for col, default_val in required_columns.items()
+        if col not in df.columns
+    }
+    if missing_columns:
+        df = df.assign(**missing_columns)
 
     # ensure datetime dtypes
     for c in ["created_at", "completed_at", "notification_sent_at"]:
-        if c in df.columns:
+        if c in df.columns and df[c].dtype.kind != 'M':
             df[c] = pd.to_datetime(df[c], errors="coerce")
 
+    # low-cardinality text -> category: unique/isin/value_counts work on integer codes.
+    # Missing values get the filter sentinels up front (a category column can't be
+    # fillna'd with a value outside its categories later on)
+    for c, sentinel in (("channel", "unknown"), ("uf", "n/i"), ("priority", "N/I")):
+        df[c] = df[c].fillna(sentinel).astype("category")
+
     # Sidebar filters
     st.sidebar.header("Filtros")
     min_date = df["created_at"].min().date()
@@ -978,36 +1317,37 @@ def show_main_dashboard(df):
         start_date, end_date = min_date, max_date
     
     # Handle filters safely - clean data first
-    channel_options = [c for c in sorted(df["channel"].unique()) if pd.notna(c) and c != '' and c != 'unknown']
+    channel_options = _opts(df["channel"], ('', 'unknown'))
     if not channel_options:
         channel_options = ['web']  # fallback
     
-    uf_options = [u for u in sorted(df["uf"].unique()) if pd.notna(u) and u != '' and u != 'n/i']
+    uf_options = _opts(df["uf"], ('', 'n/i'))
     if not uf_options:
         uf_options = ['sp']  # fallback
     
-    priority_options = [p for p in sorted(df["priority"].unique()) if pd.notna(p) and p != '' and p != 'N/I']
+    priority_options = _opts(df["priority"], ('', 'N/I'))
     if not priority_options:
         priority_options = ['Média']  # fallback
     
-    # Initialize session state for filters if not exists
-    if 'channels_selected' not in st.session_state:
-        st.session_state.channels_selected = channel_options
-    if 'ufs_selected' not in st.session_state:
-        st.session_state.ufs_selected = uf_options
-    if 'priorities_selected' not in st.session_state:
-        st.session_state.priorities_selected = priority_options
+    # The multiselects keep their selection in session_state under their own keys:
+    # start with every option selected and drop values that are no longer options
+    filter_options = {
+        'channels_selected': channel_options,
+        'ufs_selected': uf_options,
+        'priorities_selected': priority_options,
+    }
+    for key, options in filter_options.items():
+        if key not in st.session_state:
+            st.session_state[key] = list(options)
+        elif any(v not in options for v in st.session_state[key]):
+            st.session_state[key] = [v for v in st.session_state[key] if v in options]
     
-    channels = st.sidebar.multiselect("Canal", options=channel_options, default=st.session_state.channels_selected)
-    ufs = st.sidebar.multiselect("UF", options=uf_options, default=st.session_state.ufs_selected)
-    priorities = st.sidebar.multiselect("Prioridade", options=priority_options, default=st.session_state.priorities_selected)
+    channels = st.sidebar.multiselect("Canal", options=channel_options, key='channels_selected')
+    ufs = st.sidebar.multiselect("UF", options=uf_options, key='ufs_selected')
+    priorities = st.sidebar.multiselect("Prioridade", options=priority_options, key='priorities_selected')
     
-    # Reset filters button
-    if st.sidebar.button("Resetar Filtros"):
-        st.session_state.channels_selected = channel_options
-        st.session_state.ufs_selected = uf_options
-        st.session_state.priorities_selected = priority_options
-        st.rerun()
+    # Reset filters button (the callback runs before the rerun the click triggers)
+    st.sidebar.button("Resetar Filtros", on_click=_reset_filters, args=(filter_options,))
 
     # apply filters safely - ensure we have selections
     if not channels:
@@ -1018,12 +1358,18 @@ def show_main_dashboard(df):
         priorities = priority_options
     
     # Create mask with safe date filtering
-    mask = (df["created_at"].dt.date >= start_date) & (df["created_at"].dt.date <= end_date)
-    
-    # Safe filtering - handle missing/null values
-    mask &= df["channel"].fillna('unknown').isin(channels + ['unknown'])
-    mask &= df["uf"].fillna('n/i').isin(ufs + ['n/i'])
-    mask &= df["priority"].fillna('N/I').isin(priorities + ['N/I'])
+    # (all conditions as numpy bool arrays, combined in a single AND pass; the
+    # date range becomes [start, end + 1 day) datetime64 bounds, NaT never matches)
+    created = _naive_datetimes(df["created_at"]).to_numpy()
+    start_ns = np.datetime64(start_date, 'ns')
+    end_ns = np.datetime64(end_date, 'ns') + np.timedelta64(1, 'D')
+    mask = np.logical_and.reduce([
+        created >= start_ns,
+        created < end_ns,
+        _isin_codes(df["channel"], channels + ['unknown']),
+        _isin_codes(df["uf"], ufs + ['n/i']),
+        _isin_codes(df["priority"], priorities + ['N/I']),
+    ])
 
     filtered = df[mask].copy()
     
@@ -1032,7 +1378,11 @@ def show_main_dashboard(df):
         st.warning("⚠️ Nenhum registro encontrado com os filtros selecionados. Mostrando todos os dados.")
         filtered = df.copy()
 
-    metrics = compute_metrics(filtered)
+    filter_signature = (
+        tuple(sorted(channels)), tuple(sorted(ufs)), tuple(sorted(priorities)),
+        start_date, end_date, loaded_at, len(df), df["created_at"].max(), len(filtered),
+    )
+    metrics = _cached_metrics(filter_signature, filtered)
 
     # Dados já combinados incluem informações do Postgres, não precisamos recarregar
     print(f"✅ Usando dados já combinados (Postgres + MongoDB) para métricas")
@@ -1088,7 +1438,8 @@ def show_main_dashboard(df):
     p1, p2 = st.columns([1, 1])
     
     # Safe priority chart
-    priority_series = filtered["priority"].fillna('N/I').value_counts()
+    priority_series = filtered["priority"].value_counts()
+    priority_series = priority_series[priority_series > 0]  # categories absent from the filter
     if len(priority_series) > 0:
         p1.bar_chart(priority_series)
     else:
@@ -1118,51 +1469,42 @@ def show_main_dashboard(df):
 
     # Fallback phrases and curation
     st.subheader("Frases de Fallback — Ciclo de melhoria")
+    # contagem das frases calculada uma vez, usada na tabela e na curadoria
+    fallback_phrases = pd.DataFrame(columns=["phrase", "count"])
     fallback_data = filtered[filtered["fallback"] == True]
     if len(fallback_data) > 0 and 'fallback_phrase' in fallback_data.columns:
         fallback_phrases = fallback_data["fallback_phrase"].dropna().value_counts().reset_index()
-        if len(fallback_phrases) > 0:
-            fallback_phrases.columns = ["phrase", "count"]
-            st.dataframe(fallback_phrases)
-        else:
-            st.info("Nenhuma frase de fallback registrada no período")
+        fallback_phrases.columns = ["phrase", "count"]
+
+    if len(fallback_phrases) > 0:
+        st.dataframe(fallback_phrases)
     else:
         st.info("Nenhuma frase de fallback registrada no período")
 
     # simple selection and curation area
-    fallback_data = filtered[filtered["fallback"] == True]
-    if len(fallback_data) > 0 and 'fallback_phrase' in fallback_data.columns:
-        fallback_phrases = fallback_data["fallback_phrase"].dropna().value_counts().reset_index()
-        if len(fallback_phrases) > 0:
-            fallback_phrases.columns = ["phrase", "count"]
-            st.write("Selecione frases para marcar como 'para curadoria' (isso gera CSV para export).")
-            selected = st.multiselect("Frases", options=fallback_phrases["phrase"].tolist())
-            if st.button("Marcar para curadoria") and selected:
-                cur_df = pd.DataFrame({"phrase": selected, "marked_at": datetime.now()})
-                buf = io.StringIO()
-                cur_df.to_csv(buf, index=False)
-                st.download_button("Download CSV de curadoria", data=buf.getvalue(), file_name="curadoria_fallback.csv", mime="text/csv")
+    if len(fallback_phrases) > 0:
+        st.write("Selecione frases para marcar como 'para curadoria' (isso gera CSV para export).")
+        selected = st.multiselect("Frases", options=fallback_phrases["phrase"].tolist())
+        if st.button("Marcar para curadoria") and selected:
+            cur_df = pd.DataFrame({"phrase": selected, "marked_at": datetime.now()})
+            buf = io.StringIO()
+            cur_df.to_csv(buf, index=False)
+            st.download_button("Download CSV de curadoria", data=buf.getvalue(), file_name="curadoria_fallback.csv", mime="text/csv")
 
     # Export filtered data
     st.subheader("Exportar dados filtrados")
-    csv = filtered.to_csv(index=False)
-    st.download_button("Exportar CSV", data=csv, file_name="filtered_reports.csv", mime="text/csv")
+    # CSV só é gerado sob demanda (e memorizado pela assinatura dos filtros)
+    if st.button("Gerar CSV"):
+        csv = _filtered_csv(filter_signature, filtered)
+        st.download_button("Exportar CSV", data=csv, file_name="filtered_reports.csv", mime="text/csv")
 
     # Export a PNG of the channel chart
     st.subheader("Exportar gráfico PNG")
     ch = metrics["reports_by_channel"]
     if not ch.empty and len(ch) > 0:
-        fig, ax = plt.subplots(figsize=(6, 3))
         ch_clean = ch[ch['channel'].notna() & (ch['channel'] != '')]
         if len(ch_clean) > 0:
-            ax.bar(ch_clean['channel'], ch_clean['count'], color='tab:blue')
-            ax.set_title('Denúncias por Canal')
-            ax.set_ylabel('count')
-            plt.xticks(rotation=45)
-            buf_png = io.BytesIO()
-            fig.tight_layout()
-            fig.savefig(buf_png, format='png')
-            buf_png.seek(0)
+            buf_png = _channel_png(ch_clean)
             st.download_button("Download PNG (Canal)", data=buf_png, file_name="reports_by_channel.png", mime="image/png")
         else:
             st.info("Sem dados válidos para gerar gráfico")